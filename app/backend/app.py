@@ -2,22 +2,28 @@ import logging
 import os
 from pathlib import Path
 from aiohttp import web
-from azure.core.credentials import AzureKeyCredential
 from dotenv import load_dotenv
 from rtmt import RTMiddleTier
-import json
 
 from ragtools_cars import attach_car_tools
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("voicerag")
 
+# Load .env once at import rather than on every create_app() call
+load_dotenv()
+
 logger.debug("starting the websocket server")
 print("starting")
 
-async def create_app():
-    load_dotenv()
+# Sent with every realtime session, so keep it short: each token adds to time-to-first-audio.
+_SYSTEM_PROMPT = (
+    'You are a concise car assistant. For any car question, do not answer directly; output only the function call '
+    '{"function": "searchCars", "parameters": {"query": "<search query>"}}. '
+    'If nothing matches, reply "No matching cars found."'
+)
 
+async def create_app():
     llm_key = os.environ.get("AZURE_OPENAI_API_KEY")
     
     app = web.Application()
@@ -29,20 +35,7 @@ async def create_app():
         voice_choice=os.environ.get("AZURE_OPENAI_REALTIME_VOICE_CHOICE") or "alloy"
     )
 
-    # Update the system instructions to be explicit about the tool call format.
-    rtmt.system_message = """
-You are a helpful assistant specialised in car information.
-When the user asks about cars, you must not provide a direct text answer.
-Instead, you must output a function call in JSON with the following format:
-{
-  "function": "searchCars",
-  "parameters": {
-    "query": "<search query>"
-  }
-}
-If no matching car data is found, reply with: "No matching cars found."
-Keep your answer as concise as possible.
-    """.strip()
+    rtmt.system_message = _SYSTEM_PROMPT
 
     # Attach the car tool so that the middleware can invoke it.
     attach_car_tools(rtmt)
@@ -50,10 +43,22 @@ Keep your answer as concise as possible.
     rtmt.attach_to_app(app, "/realtime")
 
     current_directory = Path(__file__).parent
-    app.add_routes([web.get('/', lambda _: web.FileResponse(current_directory / 'static/index.html'))])
+    # Read the single-page frontend once instead of opening and stat-ing it on every request
+    index_bytes = (current_directory / 'static/index.html').read_bytes()
+
+    async def index(_):
+        return web.Response(body=index_bytes, content_type='text/html')
+
+    app.add_routes([web.get('/', index)])
     app.router.add_static('/', path=current_directory / 'static', name='static')
 
     return app
 
 if __name__ == "__main__":
-    web.run_app(create_app(), host="localhost", port=8765)
+    try:
+        # libuv-based event loop, not available on Windows
+        import uvloop
+        loop = uvloop.new_event_loop()
+    except ImportError:
+        loop = None
+    web.run_app(create_app(), host="localhost", port=8765, access_log=None, loop=loop)
@@ -1,4 +1,6 @@
+import logging
 import re
+from functools import partial
 from typing import Any
 
 from azure.core.credentials import AzureKeyCredential
@@ -8,6 +10,8 @@ from azure.search.documents.models import VectorizableTextQuery
 
 from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection
 
+logger = logging.getLogger("voicerag")
+
 _search_tool_schema = {
     "type": "function",
     "name": "search",
@@ -57,7 +61,7 @@ async def _search_tool(
     embedding_field: str,
     use_vector_query: bool,
     args: Any) -> ToolResult:
-    print(f"Searching for '{args['query']}' in the knowledge base.")
+    logger.info("Searching for '%s' in the knowledge base.", args["query"])
     # Hybrid query using Azure AI Search with (optional) Semantic Ranker
     vector_queries = []
     if use_vector_query:
@@ -82,7 +86,7 @@ KEY_PATTERN = re.compile(r'^[a-zA-Z0-9_=\-]+$')
 async def _report_grounding_tool(search_client: SearchClient, identifier_field: str, title_field: str, content_field: str, args: Any) -> None:
     sources = [s for s in args["sources"] if KEY_PATTERN.match(s)]
     list = " OR ".join(sources)
-    print(f"Grounding source: {list}")
+    logger.info("Grounding source: %s", list)
     # Use search instead of filter to align with how detailt integrated vectorization indexes
     # are generated, where chunk_id is searchable with a keyword tokenizer, not filterable 
     search_results = await search_client.search(search_text=list, 
@@ -114,5 +118,5 @@ def attach_rag_tools(rtmt: RTMiddleTier,
         credentials.get_token("https://search.azure.com/.default") # warm this up before we start getting requests
     search_client = SearchClient(search_endpoint, search_index, credentials, user_agent="RTMiddleTier")
 
-    rtmt.tools["search"] = Tool(schema=_search_tool_schema, target=lambda args: _search_tool(search_client, semantic_configuration, identifier_field, content_field, embedding_field, use_vector_query, args))
-    rtmt.tools["report_grounding"] = Tool(schema=_grounding_tool_schema, target=lambda args: _report_grounding_tool(search_client, identifier_field, title_field, content_field, args))
+    rtmt.tools["search"] = Tool(schema=_search_tool_schema, target=partial(_search_tool, search_client, semantic_configuration, identifier_field, content_field, embedding_field, use_vector_query))
+    rtmt.tools["report_grounding"] = Tool(schema=_grounding_tool_schema, target=partial(_report_grounding_tool, search_client, identifier_field, title_field, content_field))
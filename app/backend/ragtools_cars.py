@@ -1,5 +1,9 @@
-import re
-from typing import Any
+import asyncio
+import functools
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate
+from typing import Any, Optional
 
 from rtmt import RTMiddleTier, Tool, ToolResult, ToolResultDirection
 
@@ -34,24 +38,70 @@ import logging
 
 logger = logging.getLogger("CarTool")
 
-async def _search_car_tool(args: Any) -> ToolResult:
+# Precompute the lowercase fields and formatted result lines once. The car fields are kept as
+# parallel lists indexed by row rather than as per-row dicts.
+_NAMES_LC = [car["name"].lower() for car in STATIC_CAR_DATA]
+_DETAILS_LC = [car["details"].lower() for car in STATIC_CAR_DATA]
+_FORMATTED = [f"[{car['id']}]: {car['name']} - {car['details']}" for car in STATIC_CAR_DATA]
+
+def _build_haystack() -> tuple[str, list[int]]:
+    # All lowercase fields joined into one NUL-separated haystack, so a search is a single
+    # C-level str.find pass over the corpus instead of a Python loop over every row.
+    # Also returns the offset at which each row starts.
+    rows = [f"{name_lc}\0{details_lc}" for name_lc, details_lc in zip(_NAMES_LC, _DETAILS_LC)]
+    row_starts = list(accumulate((len(row) + 1 for row in rows), initial=0))[:-1]
+    return "\0".join(rows), row_starts
+
+_HAYSTACK, _ROW_STARTS = _build_haystack()
+
+def _substring_hits(query: str) -> set[int]:
+    # Rows whose name or details contain the query; it can't span fields as it has no NUL
+    hits = set()
+    if "\0" in query:
+        return hits
+    pos = _HAYSTACK.find(query)
+    while pos != -1:
+        row = bisect_right(_ROW_STARTS, pos) - 1
+        hits.add(row)
+        if row + 1 >= len(_ROW_STARTS):
+            break
+        pos = _HAYSTACK.find(query, _ROW_STARTS[row + 1])
+    return hits
+
+# The corpus is immutable at runtime, so results can be cached per lowercase query.
+@functools.lru_cache(maxsize=1024)
+def _search_cached(query: str) -> Optional[str]:
+    hits = _substring_hits(query)
+    if not hits:
+        return None
+    return "\n-----\n".join([_FORMATTED[i] for i in sorted(hits)])
+
+def _search_car_tool(args: Any) -> ToolResult:
     # Ensure the query is a string and in lower-case for matching.
     query = str(args.get("query", "")).lower()
     logger.info("searchCars tool invoked with query: %s", query)
-    print("_search_car_tool")
-    results = []
-    for car in STATIC_CAR_DATA:
-        if query in car["name"].lower() or query in car["details"].lower():
-            results.append(f"[{car['id']}]: {car['name']} - {car['details']}")
-    if results:
-        result_text = "\n-----\n".join(results)
-        logger.info("searchCars result: %s", result_text)
+    result_text = _search_cached(query)
+    if result_text is not None:
+        logger.debug("searchCars result: %s", result_text)
         return ToolResult(result_text, ToolResultDirection.TO_SERVER)
     else:
         logger.info("searchCars found no results for query: %s", query)
         return ToolResult("No matching cars found.", ToolResultDirection.TO_CLIENT)
 
+# Small corpora are searched inline; past this size the scan could stall audio forwarding on
+# the event loop, so it runs on a dedicated pool instead of contending with aiohttp's default one.
+_OFFLOAD_THRESHOLD = 256
+# Only created when the corpus is large enough to be offloaded, so small ones don't carry an idle pool
+_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="searchCars") if len(STATIC_CAR_DATA) > _OFFLOAD_THRESHOLD else None
+
+async def _search_car_tool_offloaded(args: Any) -> ToolResult:
+    return await asyncio.get_running_loop().run_in_executor(_pool, _search_car_tool, args)
+
+# Built once and shared by every middle tier the tool is attached to.
+_car_tool = Tool(
+    schema=_car_tool_schema,
+    target=_search_car_tool if _pool is None else _search_car_tool_offloaded)
+
 def attach_car_tools(rtmt: RTMiddleTier) -> None:
-    print("attach_car_tools")
     # Register the tool with its schema and target function.
-    rtmt.tools["searchCars"] = Tool(schema=_car_tool_schema, target=lambda args: _search_car_tool(args))
+    rtmt.tools["searchCars"] = _car_tool
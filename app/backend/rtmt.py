@@ -1,14 +1,38 @@
 import asyncio
-import json
+import inspect
 import logging
+import re
 from enum import Enum
 from typing import Any, Callable, Optional
 
 import aiohttp
+import orjson
 from aiohttp import web
 
 logger = logging.getLogger("voicerag")
 
+# Server message type -> name of the RTMiddleTier method that handles it
+_CLIENT_MESSAGE_HANDLERS = {
+    "response.done": "_on_response_done",
+    "response.output_item.added": "_on_output_item_added",
+    "conversation.item.created": "_on_item_created",
+    "response.function_call_arguments.done": "_on_function_call_arguments_done",
+    "response.output_item.done": "_on_output_item_done",
+}
+# Only messages of the handled types are inspected or rewritten. Everything else, notably the audio
+# deltas that make up most of the traffic, is forwarded without being parsed. Matching any
+# occurrence (not just the top-level "type") errs on the side of parsing.
+_CLIENT_MESSAGE_PATTERN = re.compile(r'"type"\s*:\s*"(?:' + "|".join(map(re.escape, sorted(_CLIENT_MESSAGE_HANDLERS))) + ')"')
+_SERVER_MESSAGE_PATTERN = re.compile(r'"type"\s*:\s*"session\.update"')
+# Tool-call arguments longer than this are parsed on a worker thread. orjson.loads takes ~1.7 us
+# on 4 KB against ~41 us for the to_thread hop, and holds the GIL while parsing anyway; a blocking
+# parse only reaches ~1 ms around 1 MB, so anything smaller is parsed inline.
+_INLINE_ARGUMENTS_LIMIT = 1024 * 1024
+# Frames buffered per direction before the read loop waits on the writer
+_SEND_QUEUE_SIZE = 256
+# Opening of the session object in a session.update; group 1 is the closing brace if it is empty
+_SESSION_OBJECT_PATTERN = re.compile(r'"session"\s*:\s*\{\s*(\}?)')
+
 class ToolResultDirection(Enum):
     TO_SERVER = 1
     TO_CLIENT = 2
@@ -20,16 +44,21 @@ class ToolResult:
     def __init__(self, text: str, destination: ToolResultDirection):
         self.text = text
         self.destination = destination
+        self._cached_text: Optional[str] = None
 
     def to_text(self) -> str:
         if self.text is None:
             return ""
-        return self.text if isinstance(self.text, str) else json.dumps(self.text)
+        if self._cached_text is None:
+            self._cached_text = self.text if isinstance(self.text, str) else orjson.dumps(self.text).decode()
+        return self._cached_text
 
 class Tool:
     def __init__(self, target: Any, schema: Any):
         self.target = target
         self.schema = schema
+        # Resolved once here instead of inspecting the result of every call
+        self.is_async = inspect.iscoroutinefunction(target)
 
 class RTToolCall:
     def __init__(self, tool_call_id: str, previous_id: str):
@@ -51,130 +80,245 @@ class RTMiddleTier:
         self.voice_choice = voice_choice
         self.api_version = api_version
         self.tools = {}
-        self._tools_pending = {}
+        # Function calls of the current response; rarely more than one or two, cleared on response.done
+        self._tools_pending: list[RTToolCall] = []
         self.model = None
         self.system_message = None
         self.temperature = None
         self.max_tokens = None
         self.disable_audio = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        # Built from the settings above by _build_session_overrides() when the app starts
+        self._session_overrides: dict[str, Any] = {}
+        self._session_overrides_json = ""
+        # Bound once here, so dispatch is a single dict lookup per message
+        self._client_message_handlers = {t: getattr(self, name) for t, name in _CLIENT_MESSAGE_HANDLERS.items()}
 
-    async def _process_message_to_client(self, msg: str, client_ws: web.WebSocketResponse, server_ws: web.WebSocketResponse) -> Optional[str]:
-        message = json.loads(msg)
-        updated_message = msg
-        if message is not None:
-            mtype = message["type"]
-
-            if mtype in ["session.created", "response.done"]:
-                # This is just an example of removing function calls from returning to the client
-                if mtype == "response.done":
-                    self._tools_pending.clear()
-            elif mtype == "response.output_item.added":
-                if "item" in message and message["item"]["type"] == "function_call":
-                    updated_message = None
-            elif mtype == "conversation.item.created":
-                # When we see function calls, stash them
-                if "item" in message and message["item"]["type"] == "function_call":
-                    call_id = message["item"]["call_id"]
-                    self._tools_pending[call_id] = RTToolCall(call_id, message["previous_item_id"])
-                    updated_message = None
-            elif mtype == "response.function_call_arguments.done":
-                updated_message = None
-            elif mtype == "response.output_item.done":
-                if "item" in message and message["item"]["type"] == "function_call":
-                    item = message["item"]
-                    call_id = item["call_id"]
-                    # Execute server-side tool, if any
-                    tool = self.tools.get(item["name"])
-                    if not tool:
-                        updated_message = None
-                    else:
-                        args = item["arguments"]
-                        result = await tool.target(json.loads(args))
-                        await server_ws.send_json({
-                            "type": "conversation.item.create",
-                            "item": {
-                                "type": "function_call_output",
-                                "call_id": item["call_id"],
-                                "output": result.to_text() if result.destination == ToolResultDirection.TO_SERVER else ""
-                            }
-                        })
-                        if result.destination == ToolResultDirection.TO_CLIENT:
-                            await client_ws.send_json({
-                                "type": "extension.middle_tier_tool_response",
-                                "previous_item_id": self._tools_pending[call_id].previous_id,
-                                "tool_name": item["name"],
-                                "tool_result": result.to_text()
-                            })
-                        updated_message = None
-
-        return updated_message
+    async def _process_message_to_client(self, msg: str, client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        if not _CLIENT_MESSAGE_PATTERN.search(msg):
+            return msg
+        try:
+            message = orjson.loads(msg)
+        except orjson.JSONDecodeError:
+            logger.warning("Forwarding malformed message from server unchanged")
+            return msg
+        handler = self._client_message_handlers.get(message["type"])
+        if handler is not None:
+            return await handler(msg, message, client_queue, server_queue, tool_tasks)
+        return msg
+
+    @staticmethod
+    def _is_function_call(message: dict[str, Any]) -> bool:
+        item = message.get("item")
+        return item is not None and item.get("type") == "function_call"
+
+    async def _on_response_done(self, msg: str, message: dict[str, Any], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        self._tools_pending.clear()
+        return msg
+
+    async def _on_output_item_added(self, msg: str, message: dict[str, Any], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        # This is just an example of removing function calls from returning to the client
+        return None if self._is_function_call(message) else msg
+
+    async def _on_item_created(self, msg: str, message: dict[str, Any], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        # When we see function calls, stash them
+        if not self._is_function_call(message):
+            return msg
+        call_id = message["item"]["call_id"]
+        self._tools_pending.append(RTToolCall(call_id, message["previous_item_id"]))
+        return None
+
+    async def _on_function_call_arguments_done(self, msg: str, message: dict[str, Any], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        return None
+
+    async def _on_output_item_done(self, msg: str, message: dict[str, Any], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]], tool_tasks: set[asyncio.Task]) -> Optional[str]:
+        if not self._is_function_call(message):
+            return msg
+        item = message["item"]
+        # Execute server-side tool, if any
+        tool = self.tools.get(item["name"])
+        if tool:
+            # Capture the pending call now; response.done may clear it before the tool finishes
+            pending = next((t for t in self._tools_pending if t.tool_call_id == item["call_id"]), None)
+            if pending is None:
+                logger.warning("No pending call %s for tool %s; its client result has no previous item", item["call_id"], item["name"])
+            previous_id = pending.previous_id if pending else None
+            # Run the tool in the background so server frames keep flowing while it works
+            task = asyncio.create_task(self._run_tool(tool, item, previous_id, client_queue, server_queue))
+            tool_tasks.add(task)
+            task.add_done_callback(tool_tasks.discard)
+        return None
+
+    async def _run_tool(self, tool: Tool, item: dict[str, Any], previous_id: Optional[str], client_queue: asyncio.Queue[Optional[str]], server_queue: asyncio.Queue[Optional[str]]):
+        client_message = None
+        try:
+            args = item["arguments"]
+            # Parse large argument payloads off the event loop so forwarding isn't stalled
+            if len(args) > _INLINE_ARGUMENTS_LIMIT:
+                parsed_args = await asyncio.to_thread(orjson.loads, args)
+            else:
+                parsed_args = orjson.loads(args)
+            # Targets may be plain functions when they do no I/O
+            if tool.is_async:
+                result = await tool.target(parsed_args)
+            else:
+                result = tool.target(parsed_args)
+                if inspect.isawaitable(result):
+                    # e.g. a lambda wrapping a coroutine function
+                    result = await result
+            output = result.to_text() if result.destination == ToolResultDirection.TO_SERVER else ""
+            if result.destination == ToolResultDirection.TO_CLIENT:
+                client_message = orjson.dumps({
+                    "type": "extension.middle_tier_tool_response",
+                    "previous_item_id": previous_id,
+                    "tool_name": item["name"],
+                    "tool_result": result.to_text()
+                }).decode()
+        except Exception:
+            logger.exception("Tool %s failed", item["name"])
+            # The call still needs an output, or the model is left waiting for one
+            output = f"Error: the {item['name']} tool failed."
+        server_message = orjson.dumps({
+            "type": "conversation.item.create",
+            "item": {
+                "type": "function_call_output",
+                "call_id": item["call_id"],
+                "output": output
+            }
+        }).decode()
+        # Queued rather than sent directly, so each socket's writer task stays its only writer
+        await server_queue.put(server_message)
+        if client_message is not None:
+            await client_queue.put(client_message)
+
+    def _build_session_overrides(self):
+        # Snapshot of the session settings, taken at app startup; changes made after that
+        # aren't seen until this is called again
+        overrides = {}
+        if self.system_message is not None:
+            overrides["instructions"] = self.system_message
+        if self.temperature is not None:
+            overrides["temperature"] = self.temperature
+        if self.max_tokens is not None:
+            overrides["max_response_output_tokens"] = self.max_tokens
+        if self.disable_audio is not None:
+            overrides["disable_audio"] = self.disable_audio
+        if self.voice_choice is not None:
+            overrides["voice"] = self.voice_choice
+        self._session_overrides = overrides
+        # Key/value pairs without the surrounding braces, ready to splice into a session object
+        self._session_overrides_json = orjson.dumps(overrides).decode()[1:-1]
 
     async def _process_message_to_server(self, msg: str, ws: web.WebSocketResponse) -> Optional[str]:
-        message = json.loads(msg)
-        updated_message = msg
-        if message is not None:
-            mtype = message["type"]
-            if mtype == "session.update":
-                session = message["session"]
-                if self.system_message is not None:
-                    session["instructions"] = self.system_message
-                if self.temperature is not None:
-                    session["temperature"] = self.temperature
-                if self.max_tokens is not None:
-                    session["max_response_output_tokens"] = self.max_tokens
-                if self.disable_audio is not None:
-                    session["disable_audio"] = self.disable_audio
-                if self.voice_choice is not None:
-                    session["voice"] = self.voice_choice
-                message["session"] = session
-                updated_message = json.dumps(message)
-
-        return updated_message
+        if not _SERVER_MESSAGE_PATTERN.search(msg):
+            return msg
+        overrides = self._session_overrides
+        if not overrides:
+            # Nothing to enforce, so the client's message goes through untouched
+            return msg
+        match = _SESSION_OBJECT_PATTERN.search(msg)
+        # Splice the pre-serialized overrides into the session object instead of a loads/dumps
+        # round trip. They go first, so only do it when the client doesn't set the same keys.
+        if match and not any(f'"{key}"' in msg for key in overrides):
+            separator = "" if match.group(1) else ","
+            return msg[:match.start(1)] + self._session_overrides_json + separator + msg[match.start(1):]
+        try:
+            message = orjson.loads(msg)
+        except orjson.JSONDecodeError:
+            logger.warning("Forwarding malformed message from client unchanged")
+            return msg
+        if message["type"] == "session.update":
+            message["session"].update(overrides)
+            return orjson.dumps(message).decode()
+        return msg
 
     async def _forward_messages(self, client_ws: web.WebSocketResponse):
         # This function will open another WebSocket to the Azure Realtime endpoint using your API key
-        base_url = self.endpoint
-        async with aiohttp.ClientSession(base_url=base_url) as session:
-            params = {"api-version": self.api_version, "deployment": self.deployment}
-            headers = {}
-            if self.api_key:
-                headers["api-key"] = self.api_key
-
-            async with session.ws_connect("/openai/realtime", headers=headers, params=params) as target_ws:
-
-                async def from_client_to_server():
-                    async for msg in client_ws:
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            new_msg = await self._process_message_to_server(msg.data, client_ws)
-                            if new_msg is not None:
-                                await target_ws.send_str(new_msg)
-                        else:
-                            logger.warning("Unsupported message type from client: %s", msg.type)
-                    # Client closed
-                    if target_ws:
-                        await target_ws.close()
-
-                async def from_server_to_client():
-                    async for msg in target_ws:
-                        if msg.type == aiohttp.WSMsgType.TEXT:
-                            new_msg = await self._process_message_to_client(msg.data, client_ws, target_ws)
-                            if new_msg is not None:
-                                await client_ws.send_str(new_msg)
-                        else:
-                            logger.warning("Unsupported message type from server: %s", msg.type)
-
-                try:
-                    await asyncio.gather(from_client_to_server(), from_server_to_client())
-                except ConnectionResetError:
-                    pass
+        params = {"api-version": self.api_version, "deployment": self.deployment}
+        headers = {}
+        if self.api_key:
+            headers["api-key"] = self.api_key
+
+        async with self._session.ws_connect("/openai/realtime", headers=headers, params=params) as target_ws:
+
+            # Outgoing frames go through a queue per socket, drained by its own writer task, so the
+            # read loops aren't held up waiting for each write to complete
+            server_queue: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize=_SEND_QUEUE_SIZE)
+            client_queue: asyncio.Queue[Optional[str]] = asyncio.Queue(maxsize=_SEND_QUEUE_SIZE)
+            # Tool calls of this connection still running in the background
+            tool_tasks: set[asyncio.Task] = set()
+
+            async def from_client_to_server():
+                async for msg in client_ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        new_msg = await self._process_message_to_server(msg.data, client_ws)
+                        if new_msg is not None:
+                            await server_queue.put(new_msg)
+                    else:
+                        logger.warning("Unsupported message type from client: %s", msg.type)
+                # Client closed
+                await server_queue.put(None)
+
+            async def from_server_to_client():
+                async for msg in target_ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        new_msg = await self._process_message_to_client(msg.data, client_queue, server_queue, tool_tasks)
+                        if new_msg is not None:
+                            await client_queue.put(new_msg)
+                    else:
+                        logger.warning("Unsupported message type from server: %s", msg.type)
+                await client_queue.put(None)
+
+            async def to_server():
+                while True:
+                    new_msg = await server_queue.get()
+                    if new_msg is None:
+                        break
+                    await target_ws.send_str(new_msg)
+                # Everything the client sent has been flushed; closing ends from_server_to_client
+                await target_ws.close()
+
+            async def to_client():
+                while True:
+                    new_msg = await client_queue.get()
+                    if new_msg is None:
+                        break
+                    await client_ws.send_str(new_msg)
+
+            tasks = [asyncio.create_task(c) for c in (from_client_to_server(), from_server_to_client(), to_server(), to_client())]
+            try:
+                await asyncio.gather(*tasks)
+            except ConnectionResetError:
+                pass
+            finally:
+                for task in tasks:
+                    task.cancel()
+                for task in tool_tasks:
+                    task.cancel()
 
     async def _websocket_handler(self, request: web.Request):
-        ws = web.WebSocketResponse()
+        # Skip permessage-deflate: base64 PCM barely compresses and zlib would run on every frame
+        ws = web.WebSocketResponse(compress=False)
         await ws.prepare(request)
         await self._forward_messages(ws)
         return ws
 
  
 
+    async def _on_startup(self, app: web.Application):
+        self._build_session_overrides()
+        # One session (and connection pool) for the app's lifetime rather than one per client.
+        # Every browser holds one upstream websocket for its whole call, so the connector must
+        # not cap them (the default limit of 100 would make the 101st client wait).
+        self._session = aiohttp.ClientSession(base_url=self.endpoint, connector=aiohttp.TCPConnector(limit=0))
+
+    async def _on_cleanup(self, app: web.Application):
+        # Startup may have failed before the session was created
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
     def attach_to_app(self, app: web.Application, path: str):
         app.router.add_get(path, self._websocket_handler)
+        app.on_startup.append(self._on_startup)
+        app.on_cleanup.append(self._on_cleanup)
@@ -2,29 +2,40 @@ class AudioPlaybackWorklet extends AudioWorkletProcessor {
     constructor() {
         super();
         this.port.onmessage = this.handleMessage.bind(this);
-        this.buffer = [];
+        // Queue of received Int16Array chunks plus a read offset into the first one, so queued
+        // audio is consumed in place instead of being re-sliced on every render quantum
+        this.chunks = [];
+        this.offset = 0;
     }
 
     handleMessage(event) {
         if (event.data === null) {
-            this.buffer = [];
+            this.chunks = [];
+            this.offset = 0;
             return;
         }
-        this.buffer.push(...event.data);
+        this.chunks.push(event.data);
     }
 
     process(inputs, outputs, parameters) {
         const output = outputs[0];
         const channel = output[0];
 
-        if (this.buffer.length > channel.length) {
-            const toProcess = this.buffer.slice(0, channel.length);
-            this.buffer = this.buffer.slice(channel.length);
-            channel.set(toProcess.map(v => v / 32768));
-        } else {
-            channel.set(this.buffer.map(v => v / 32768));
-            this.buffer = [];
+        let written = 0;
+        while (written < channel.length && this.chunks.length > 0) {
+            const chunk = this.chunks[0];
+            const count = Math.min(channel.length - written, chunk.length - this.offset);
+            for (let i = 0; i < count; i++) {
+                channel[written + i] = chunk[this.offset + i] / 32768;
+            }
+            written += count;
+            this.offset += count;
+            if (this.offset === chunk.length) {
+                this.chunks.shift();
+                this.offset = 0;
+            }
         }
+        channel.fill(0, written);
 
         return true;
     }
@@ -11,7 +11,8 @@ class PCMAudioProcessor extends AudioWorkletProcessor {
         if (input.length > 0) {
             const float32Buffer = input[0];
             const int16Buffer = this.float32ToInt16(float32Buffer);
-            this.port.postMessage(int16Buffer);
+            // Transfer instead of structured-clone copying the freshly converted samples
+            this.port.postMessage(int16Buffer, [int16Buffer.buffer]);
         }
         return true;
     }
@@ -14,7 +14,11 @@ export default function useAudioPlayer() {
 
     const play = (base64Audio: string) => {
         const binary = atob(base64Audio);
-        const bytes = Uint8Array.from(binary, c => c.charCodeAt(0));
+        // Plain indexed loop; Uint8Array.from with a map callback iterates and calls back per byte
+        const bytes = new Uint8Array(binary.length);
+        for (let i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
         const pcmData = new Int16Array(bytes.buffer);
 
         audioPlayer.current?.play(pcmData);
@@ -10,27 +10,31 @@ type Parameters = {
 export default function useAudioRecorder({ onAudioRecorded }: Parameters) {
     const audioRecorder = useRef<Recorder>();
 
-    let buffer = new Uint8Array();
-
-    const appendToBuffer = (newData: Uint8Array) => {
-        const newBuffer = new Uint8Array(buffer.length + newData.length);
-        newBuffer.set(buffer);
-        newBuffer.set(newData, buffer.length);
-        buffer = newBuffer;
-    };
+    // Fixed-size staging buffer filled in place, instead of reallocating and copying the whole
+    // pending buffer for every incoming frame. Kept in refs so they survive re-renders.
+    const buffer = useRef<Uint8Array>();
+    const bufferedLength = useRef(0);
 
     const handleAudioData = (data: Iterable<number>) => {
         const uint8Array = new Uint8Array(data);
-        appendToBuffer(uint8Array);
+        if (!buffer.current) {
+            buffer.current = new Uint8Array(BUFFER_SIZE);
+        }
 
-        if (buffer.length >= BUFFER_SIZE) {
-            const toSend = new Uint8Array(buffer.slice(0, BUFFER_SIZE));
-            buffer = new Uint8Array(buffer.slice(BUFFER_SIZE));
+        let read = 0;
+        while (read < uint8Array.length) {
+            const count = Math.min(BUFFER_SIZE - bufferedLength.current, uint8Array.length - read);
+            buffer.current.set(uint8Array.subarray(read, read + count), bufferedLength.current);
+            bufferedLength.current += count;
+            read += count;
 
-            const regularArray = String.fromCharCode(...toSend);
-            const base64 = btoa(regularArray);
+            if (bufferedLength.current === BUFFER_SIZE) {
+                const regularArray = String.fromCharCode(...buffer.current);
+                const base64 = btoa(regularArray);
 
-            onAudioRecorded(base64);
+                onAudioRecorded(base64);
+                bufferedLength.current = 0;
+            }
         }
     };
 
@@ -1,7 +1,6 @@
 import useWebSocket from "react-use-websocket";
 
 import {
-    InputAudioBufferAppendCommand,
     InputAudioBufferClearCommand,
     Message,
     ResponseAudioDelta,
@@ -55,7 +54,7 @@ export default function useRealTime({
         ? `${aoaiEndpointOverride}/openai/realtime?api-key=${aoaiApiKeyOverride}&deployment=${aoaiModelOverride}&api-version=2024-10-01-preview`
         : `/realtime`;
 
-    const { sendJsonMessage } = useWebSocket(wsEndpoint, {
+    const { sendJsonMessage, sendMessage } = useWebSocket(wsEndpoint, {
         onOpen: () => onWebSocketOpen?.(),
         onClose: () => onWebSocketClose?.(),
         onError: event => onWebSocketError?.(event),
@@ -83,12 +82,9 @@ export default function useRealTime({
     };
 
     const addUserAudio = (base64Audio: string) => {
-        const command: InputAudioBufferAppendCommand = {
-            type: "input_audio_buffer.append",
-            audio: base64Audio
-        };
-
-        sendJsonMessage(command);
+        // Base64 never needs JSON escaping, so splice it into a fixed envelope rather than
+        // running JSON.stringify over the whole audio payload for every chunk
+        sendMessage(`{"type":"input_audio_buffer.append","audio":"${base64Audio}"}`);
     };
 
     const inputAudioBufferClear = () => {